@@ -3,11 +3,19 @@ FarmFlow Enhanced Flask Application
 Disease % Detection + DCRI + Insurance
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request
 import numpy as np
 from PIL import Image
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+import orjson
+import sqlite3
 import os
 from io import BytesIO
 import base64
@@ -15,6 +23,16 @@ from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 import random
 
+try:
+    from numba import njit, prange
+except ImportError:
+    # Numba is optional; without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+    prange = range
+
 # =============== Initialize Flask App ===============
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
@@ -23,20 +41,79 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 PINATA_API_KEY = ""
 PINATA_SECRET_KEY = ""
 
+# Shared HTTP session so Pinata / Open-Meteo / SoilGrids calls reuse
+# keep-alive connections instead of a new TCP+TLS handshake each time
+SESSION = requests.Session()
+SESSION.headers.update({'Connection': 'keep-alive'})
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+))
+
+# Weather/soil lookups cached by location rounded to ~1km; SoilGrids data is
+# static so it can be kept much longer than the current weather
+WEATHER_CACHE = TTLCache(maxsize=4096, ttl=3600)
+SOIL_CACHE = TTLCache(maxsize=4096, ttl=86400)
+CACHE_LOCK = threading.Lock()
+
+# Max weather/soil requests in flight during the daily batch fetch
+ENV_FETCH_CONCURRENCY = 32
+
+# Worker pool for running a listing's IPFS upload, disease model and API
+# calls side by side (all either I/O-bound or release the GIL)
+EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
 # =============== Load Models ===============
 print("=" * 60)
 print("Loading models...")
 
 # Disease Percentage Model
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    disease_pct_model = keras.models.load_model('disease_percentage_model.h5')
-    DISEASE_PCT_MODEL_AVAILABLE = True
-    print("✅ Disease Percentage model loaded")
-except Exception as e:
-    DISEASE_PCT_MODEL_AVAILABLE = False
-    print(f"⚠️ Disease Percentage model not available: {e}")
+# Backends in order of preference: the int8 TFLite model from
+# convert_disease_model.py, then the full Keras model under TensorFlow
+DISEASE_PCT_BACKEND = None
+
+if os.path.exists('disease_percentage_model.tflite'):
+    try:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        # Validate the model and read its I/O details with a single-threaded
+        # interpreter; the real one is created per process on first use (its
+        # worker threads would not survive gunicorn's fork after --preload)
+        probe = Interpreter('disease_percentage_model.tflite', num_threads=1)
+        probe.allocate_tensors()
+        TFLITE_INPUT = probe.get_input_details()[0]
+        TFLITE_OUTPUT = probe.get_output_details()[0]
+        del probe
+        
+        TFLITE_LOCK = threading.Lock()  # the interpreter is not thread-safe
+        disease_pct_tflite = None
+        disease_pct_tflite_pid = None
+        DISEASE_PCT_BACKEND = 'tflite'
+        print("✅ Disease Percentage model loaded (TFLite int8)")
+    except Exception as e:
+        print(f"   TFLite model not available ({e})")
+
+if DISEASE_PCT_BACKEND is None and os.path.exists('disease_percentage_model.h5'):
+    try:
+        import tensorflow as tf
+        from tensorflow import keras
+        # The Keras model itself is loaded per process on first use: loading it
+        # here would start TF's runtime thread pools in the gunicorn master,
+        # and they do not survive the fork after --preload
+        TF_MODEL_LOCK = threading.Lock()
+        disease_pct_tf_fns = None
+        disease_pct_tf_pid = None
+        DISEASE_PCT_BACKEND = 'tensorflow'
+        print("✅ Disease Percentage model found (loaded per worker on first use)")
+    except Exception as e:
+        print(f"   TensorFlow not available ({e})")
+
+DISEASE_PCT_MODEL_AVAILABLE = DISEASE_PCT_BACKEND is not None
+if not DISEASE_PCT_MODEL_AVAILABLE:
+    print("⚠️ Disease Percentage model not available")
     print("   Using mock predictions")
 
 # DCRI Model (RandomForest version)
@@ -50,8 +127,71 @@ except Exception as e:
     print(f"⚠️ DCRI model not available: {e}")
     print("   Using mock predictions")
 
-# Store crop DCRI data
-crop_dcri_data = {}
+# =============== Crop Storage ===============
+# Crops tracked for daily DCRI updates live in SQLite so each update writes
+# only its own row. Connections are per thread (and opened lazily, so none
+# is inherited across gunicorn's fork)
+DB_PATH = 'crops.db'
+_db_local = threading.local()
+
+def get_db():
+    """Return this thread's SQLite connection"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _db_local.conn = conn
+    return conn
+
+def close_db():
+    """Close this thread's SQLite connection, if any"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _db_local.conn = None
+
+def init_db():
+    """Create the crops table"""
+    with sqlite3.connect(DB_PATH) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS crops (
+                id TEXT PRIMARY KEY,
+                crop_name TEXT,
+                latitude REAL,
+                longitude REAL,
+                last_disease_pct REAL,
+                last_update TEXT
+            )
+        """)
+    conn.close()
+
+def save_crop(crop_id, crop_name, lat, lon, disease_pct, last_update):
+    """Insert or replace a single crop row"""
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO crops VALUES (?, ?, ?, ?, ?, ?)",
+            (str(crop_id), crop_name, lat, lon, float(disease_pct), last_update)
+        )
+
+def load_crops():
+    """Return all tracked crops as a dict of crop_id -> crop data"""
+    rows = get_db().execute("SELECT * FROM crops").fetchall()
+    return {row['id']: dict(row) for row in rows}
+
+def update_crop_disease(updates):
+    """Store new (disease_pct, last_update) for many crops in one transaction"""
+    conn = get_db()
+    with conn:
+        conn.executemany(
+            "UPDATE crops SET last_disease_pct = ?, last_update = ? WHERE id = ?",
+            [(float(pct), last_update, str(crop_id)) for crop_id, pct, last_update in updates]
+        )
+
+# Shared random generator for simulated noise
+RNG = np.random.default_rng()
 
 # Crop type mapping
 CROP_MAP = {
@@ -62,15 +202,17 @@ CROP_MAP = {
 
 # =============== Helper Functions ===============
 
-def upload_to_ipfs(image_file):
+def decode_base64_image(image_base64):
+    """Decode a base64 image, skipping the data URL prefix if present"""
+    # Slice past the comma rather than split(), which copies both halves
+    comma = image_base64.find(',')
+    return base64.b64decode(image_base64[comma + 1:] if comma >= 0 else image_base64)
+
+def upload_to_ipfs(image_file, content_type='image/jpeg'):
     """Upload image to IPFS via Pinata"""
     try:
-        # Remove data URL prefix if present
         if isinstance(image_file, str):
-            if ',' in image_file:
-                image_file = image_file.split(',')[1]
-            image_data = base64.b64decode(image_file)
-            image_file = BytesIO(image_data)
+            image_file = BytesIO(decode_base64_image(image_file))
         
         url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
         headers = {
@@ -78,8 +220,8 @@ def upload_to_ipfs(image_file):
             'pinata_secret_api_key': PINATA_SECRET_KEY
         }
         
-        files = {'file': ('crop_image.jpg', image_file, 'image/jpeg')}
-        response = requests.post(url, files=files, headers=headers, timeout=30)
+        files = {'file': ('crop_image.jpg', image_file, content_type)}
+        response = SESSION.post(url, files=files, headers=headers, timeout=30)
         
         if response.status_code == 200:
             ipfs_hash = response.json()['IpfsHash']
@@ -95,40 +237,85 @@ def upload_to_ipfs(image_file):
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         return f"QmMock{timestamp}"
 
-def get_weather_data(lat, lon):
-    """Fetch weather data from Open-Meteo API (Free, no API key needed)"""
-    try:
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            'latitude': lat,
-            'longitude': lon,
-            'current': 'temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m',
-            'timezone': 'auto'
+WEATHER_API_URL = "https://api.open-meteo.com/v1/forecast"
+SOIL_API_URL = "https://rest.isric.org/soilgrids/v2.0/properties/query"
+
+def weather_params(lat, lon):
+    """Query parameters for the Open-Meteo forecast API"""
+    return {
+        'latitude': lat,
+        'longitude': lon,
+        'current': 'temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m',
+        'timezone': 'auto'
+    }
+
+def parse_weather_response(response):
+    """Turn an Open-Meteo response into weather info (works for requests and httpx)"""
+    if response.status_code == 200:
+        data = response.json()
+        current = data.get('current', {})
+        
+        weather_info = {
+            'temperature': round(current.get('temperature_2m', 25.0), 1),
+            'humidity': round(current.get('relative_humidity_2m', 60.0), 1),
+            'rainfall': round(current.get('precipitation', 0.0), 1),
+            'wind_speed': round(current.get('wind_speed_10m', 10.0), 1)
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            current = data.get('current', {})
-            
-            weather_info = {
-                'temperature': round(current.get('temperature_2m', 25.0), 1),
-                'humidity': round(current.get('relative_humidity_2m', 60.0), 1),
-                'rainfall': round(current.get('precipitation', 0.0), 1),
-                'wind_speed': round(current.get('wind_speed_10m', 10.0), 1)
-            }
-            
-            print(f"✅ Weather data fetched: Temp={weather_info['temperature']}°C, Humidity={weather_info['humidity']}%")
-            return weather_info
-        else:
-            print(f"⚠️ Weather API error: {response.status_code}")
-            return get_default_weather()
-            
+        print(f"✅ Weather data fetched: Temp={weather_info['temperature']}°C, Humidity={weather_info['humidity']}%")
+        return weather_info
+    else:
+        print(f"⚠️ Weather API error: {response.status_code}")
+        return get_default_weather()
+
+def location_key(lat, lon):
+    """Cache key for a location (rounded to 2 decimals)"""
+    return (round(lat, 2), round(lon, 2))
+
+def cache_lookup(cache, lat, lon):
+    """Return a copy of the cached value for a location, or None"""
+    with CACHE_LOCK:
+        value = cache.get(location_key(lat, lon))
+    return dict(value) if value is not None else None
+
+def cache_store(cache, lat, lon, response, value):
+    """Cache a parsed API result, skipping fallback values from failed calls"""
+    if response.status_code == 200:
+        with CACHE_LOCK:
+            cache[location_key(lat, lon)] = dict(value)
+    return value
+
+def get_weather_data(lat, lon):
+    """Fetch weather data from Open-Meteo API (single listings; see fetch_env_data for batches)"""
+    cached = cache_lookup(WEATHER_CACHE, lat, lon)
+    if cached is not None:
+        return cached
+    
+    try:
+        response = SESSION.get(WEATHER_API_URL, params=weather_params(lat, lon), timeout=10)
+        return cache_store(WEATHER_CACHE, lat, lon, response, parse_weather_response(response))
     except Exception as e:
         print(f"Weather API error: {e}")
         return get_default_weather()
 
+async def get_weather_data_async(client, limiter, lat, lon):
+    """Async version of get_weather_data; returns None if the API call fails"""
+    cached = cache_lookup(WEATHER_CACHE, lat, lon)
+    if cached is not None:
+        return cached
+    
+    try:
+        async with limiter:
+            response = await client.get(WEATHER_API_URL, params=weather_params(lat, lon),
+                                        timeout=httpx.Timeout(10, pool=None))
+        if response.status_code != 200:
+            print(f"⚠️ Weather API error: {response.status_code}")
+            return None
+        return cache_store(WEATHER_CACHE, lat, lon, response, parse_weather_response(response))
+    except Exception as e:
+        print(f"Weather API error: {e!r}")
+        return None
+
 def get_default_weather():
     """Return default weather values"""
     return {
@@ -138,65 +325,90 @@ def get_default_weather():
         'wind_speed': 12.0
     }
 
-def get_soil_data(lat, lon):
-    """Get soil data from ISRIC SoilGrids API"""
-    try:
-        # ISRIC SoilGrids v2.0 API
-        url = f"https://rest.isric.org/soilgrids/v2.0/properties/query"
-        params = {
-            'lon': lon,
-            'lat': lat,
-            'property': 'nitrogen,phh2o,cec',  # nitrogen, pH, cation exchange capacity
-            'depth': '0-5cm',
-            'value': 'mean'
+def soil_params(lat, lon):
+    """Query parameters for the ISRIC SoilGrids v2.0 API"""
+    return {
+        'lon': lon,
+        'lat': lat,
+        'property': 'nitrogen,phh2o,cec',  # nitrogen, pH, cation exchange capacity
+        'depth': '0-5cm',
+        'value': 'mean'
+    }
+
+def parse_soil_response(response):
+    """Turn a SoilGrids response into soil info (works for requests and httpx)"""
+    if response.status_code == 200:
+        data = response.json()
+        properties = data.get('properties', {}).get('layers', [])
+        
+        soil_info = {
+            'ph': 6.5,  # default
+            'moisture': 50.0,  # estimated
+            'nitrogen': 30.0,  # default
+            'phosphorus': 25.0,  # default
+            'potassium': 35.0  # default
         }
         
-        response = requests.get(url, params=params, timeout=15)
-        
-        if response.status_code == 200:
-            data = response.json()
-            properties = data.get('properties', {}).get('layers', [])
-            
-            soil_info = {
-                'ph': 6.5,  # default
-                'moisture': 50.0,  # estimated
-                'nitrogen': 30.0,  # default
-                'phosphorus': 25.0,  # default
-                'potassium': 35.0  # default
-            }
-            
-            # Extract pH (phh2o)
-            for prop in properties:
-                if prop.get('name') == 'phh2o':
-                    depths = prop.get('depths', [])
-                    if depths:
-                        # pH is stored as pH * 10, so divide by 10
-                        ph_value = depths[0].get('values', {}).get('mean', 65) / 10
-                        soil_info['ph'] = round(ph_value, 2)
-                
-                # Extract nitrogen
-                elif prop.get('name') == 'nitrogen':
-                    depths = prop.get('depths', [])
-                    if depths:
-                        # Nitrogen in cg/kg, convert to a reasonable scale
-                        nitrogen_value = depths[0].get('values', {}).get('mean', 30) / 10
-                        soil_info['nitrogen'] = round(nitrogen_value, 1)
-            
-            # Add some variation to other parameters
-            soil_info['moisture'] = round(45 + np.random.uniform(-10, 10), 1)
-            soil_info['phosphorus'] = round(25 + np.random.uniform(-5, 5), 1)
-            soil_info['potassium'] = round(35 + np.random.uniform(-5, 5), 1)
-            
-            print(f"✅ Soil data fetched: pH={soil_info['ph']}, N={soil_info['nitrogen']}")
-            return soil_info
-        else:
-            print(f"⚠️ Soil API error: {response.status_code}")
-            return get_default_soil()
+        # Extract pH (phh2o)
+        for prop in properties:
+            if prop.get('name') == 'phh2o':
+                depths = prop.get('depths', [])
+                if depths:
+                    # pH is stored as pH * 10, so divide by 10
+                    ph_value = depths[0].get('values', {}).get('mean', 65) / 10
+                    soil_info['ph'] = round(ph_value, 2)
             
+            # Extract nitrogen
+            elif prop.get('name') == 'nitrogen':
+                depths = prop.get('depths', [])
+                if depths:
+                    # Nitrogen in cg/kg, convert to a reasonable scale
+                    nitrogen_value = depths[0].get('values', {}).get('mean', 30) / 10
+                    soil_info['nitrogen'] = round(nitrogen_value, 1)
+        
+        # Add some variation to other parameters
+        moisture_noise, phosphorus_noise, potassium_noise = RNG.uniform([-10, -5, -5], [10, 5, 5])
+        soil_info['moisture'] = round(45 + float(moisture_noise), 1)
+        soil_info['phosphorus'] = round(25 + float(phosphorus_noise), 1)
+        soil_info['potassium'] = round(35 + float(potassium_noise), 1)
+        
+        print(f"✅ Soil data fetched: pH={soil_info['ph']}, N={soil_info['nitrogen']}")
+        return soil_info
+    else:
+        print(f"⚠️ Soil API error: {response.status_code}")
+        return get_default_soil()
+
+def get_soil_data(lat, lon):
+    """Get soil data from ISRIC SoilGrids API (single listings; see fetch_env_data for batches)"""
+    cached = cache_lookup(SOIL_CACHE, lat, lon)
+    if cached is not None:
+        return cached
+    
+    try:
+        response = SESSION.get(SOIL_API_URL, params=soil_params(lat, lon), timeout=15)
+        return cache_store(SOIL_CACHE, lat, lon, response, parse_soil_response(response))
     except Exception as e:
         print(f"Soil API error: {e}")
         return get_default_soil()
 
+async def get_soil_data_async(client, limiter, lat, lon):
+    """Async version of get_soil_data; returns None if the API call fails"""
+    cached = cache_lookup(SOIL_CACHE, lat, lon)
+    if cached is not None:
+        return cached
+    
+    try:
+        async with limiter:
+            response = await client.get(SOIL_API_URL, params=soil_params(lat, lon),
+                                        timeout=httpx.Timeout(15, pool=None))
+        if response.status_code != 200:
+            print(f"⚠️ Soil API error: {response.status_code}")
+            return None
+        return cache_store(SOIL_CACHE, lat, lon, response, parse_soil_response(response))
+    except Exception as e:
+        print(f"Soil API error: {e!r}")
+        return None
+
 def get_default_soil():
     """Return default soil values"""
     return {
@@ -207,81 +419,224 @@ def get_default_soil():
         'potassium': 35.0
     }
 
+async def fetch_env_data_async(locations):
+    """Fetch (weather, soil) for every (lat, lon), at most ENV_FETCH_CONCURRENCY requests at a time"""
+    # Nearby crops share a cache key, so only query each rounded location once
+    unique = {location_key(lat, lon): (lat, lon) for lat, lon in locations}
+    
+    # The semaphore keeps queued requests from waiting on the connection pool,
+    # where their timeout would already be running; pool=None as a backstop
+    limiter = asyncio.Semaphore(ENV_FETCH_CONCURRENCY)
+    limits = httpx.Limits(max_connections=ENV_FETCH_CONCURRENCY,
+                          max_keepalive_connections=ENV_FETCH_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(15, pool=None), limits=limits) as client:
+        results = await asyncio.gather(*[
+            asyncio.gather(get_weather_data_async(client, limiter, lat, lon),
+                           get_soil_data_async(client, limiter, lat, lon))
+            for lat, lon in unique.values()
+        ])
+    
+    # Failed lookups fall back to defaults; report how many so crops scored
+    # on default data don't go unnoticed
+    weather_failures = sum(weather is None for weather, _ in results)
+    soil_failures = sum(soil is None for _, soil in results)
+    if weather_failures or soil_failures:
+        print(f"⚠️ Of {len(unique)} locations, weather failed for {weather_failures} and "
+              f"soil failed for {soil_failures}; those crops use default values")
+    
+    by_key = {
+        key: (weather if weather is not None else get_default_weather(),
+              soil if soil is not None else get_default_soil())
+        for key, (weather, soil) in zip(unique, results)
+    }
+    return [by_key[location_key(lat, lon)] for lat, lon in locations]
+
+def fetch_env_data(locations):
+    """Blocking wrapper around fetch_env_data_async for the daily DCRI update"""
+    return asyncio.run(fetch_env_data_async(locations))
+
+def build_disease_fns(model, jit_compile):
+    """Build (single, batch) tf.functions that take raw uint8 pixels"""
+    # The fixed input signatures force a single trace each, and the /255
+    # scaling is fused into the graph
+    @tf.function(jit_compile=jit_compile,
+                 input_signature=[tf.TensorSpec((1, 224, 224, 3), tf.uint8)])
+    def disease_pct_infer(x):
+        return model(tf.cast(x, tf.float32) / 255.0, training=False)
+    
+    # Same graph for (N, 224, 224, 3) batches; XLA compiles once per batch size
+    @tf.function(jit_compile=jit_compile,
+                 input_signature=[tf.TensorSpec((None, 224, 224, 3), tf.uint8)])
+    def disease_pct_infer_batch(x):
+        return model(tf.cast(x, tf.float32) / 255.0, training=False)
+    
+    return disease_pct_infer, disease_pct_infer_batch
+
+def get_tf_disease_fns():
+    """Return this process's (single, batch) TF inference functions, loading the model on first use"""
+    global disease_pct_tf_fns, disease_pct_tf_pid
+    with TF_MODEL_LOCK:
+        if disease_pct_tf_fns is None or disease_pct_tf_pid != os.getpid():
+            disease_pct_model = keras.models.load_model('disease_percentage_model.h5')
+            
+            # Prefer XLA; if the model can't be compiled (unsupported op, no XLA
+            # CPU support) fall back to a plain graph once instead of failing
+            # every request
+            fns = build_disease_fns(disease_pct_model, jit_compile=True)
+            try:
+                fns[0](tf.zeros((1, 224, 224, 3), tf.uint8))
+            except Exception as e:
+                print(f"⚠️ XLA compilation of the disease model failed, using a non-XLA graph: {e}")
+                fns = build_disease_fns(disease_pct_model, jit_compile=False)
+            
+            disease_pct_tf_fns = fns
+            disease_pct_tf_pid = os.getpid()
+            print(f"✅ Disease Percentage model loaded in process {disease_pct_tf_pid}")
+    return disease_pct_tf_fns
+
+def get_tflite_interpreter():
+    """Return this process's TFLite interpreter (call with TFLITE_LOCK held)"""
+    global disease_pct_tflite, disease_pct_tflite_pid
+    if disease_pct_tflite is None or disease_pct_tflite_pid != os.getpid():
+        disease_pct_tflite = Interpreter('disease_percentage_model.tflite', num_threads=4)
+        disease_pct_tflite.allocate_tensors()
+        disease_pct_tflite_pid = os.getpid()
+    return disease_pct_tflite
+
+def tflite_disease_infer(img_array):
+    """Run the TFLite disease model on a (1, 224, 224, 3) uint8 array"""
+    scale, zero_point = TFLITE_INPUT['quantization']
+    dtype = TFLITE_INPUT['dtype']
+    x = img_array.astype(np.float32) / 255.0
+    if scale:
+        # Quantize the normalized pixels with the model's input parameters
+        info = np.iinfo(dtype)
+        x = np.clip(np.round(x / scale + zero_point), info.min, info.max)
+    x = x.astype(dtype)
+    
+    with TFLITE_LOCK:
+        interpreter = get_tflite_interpreter()
+        interpreter.set_tensor(TFLITE_INPUT['index'], x)
+        interpreter.invoke()
+        y = interpreter.get_tensor(TFLITE_OUTPUT['index'])
+    
+    scale, zero_point = TFLITE_OUTPUT['quantization']
+    if scale:
+        y = (y.astype(np.float32) - zero_point) * scale
+    return float(y.ravel()[0])
+
+def model_input_array(image):
+    """Resize an image once to the model's 224x224 uint8 RGB input"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image.resize((224, 224), Image.BILINEAR), dtype=np.uint8)
+
 def predict_disease_percentage(image):
     """Predict disease percentage from crop image"""
     if not DISEASE_PCT_MODEL_AVAILABLE:
-        # Dummy prediction based on simple image analysis
+        # Dummy prediction based on simple image analysis (resizes to 100x100 itself)
         return simple_disease_detection(image)
     
+    # Resize once; the fallback below reuses this array instead of going back
+    # to the full-size image
+    img_array = model_input_array(image)
+    
     try:
-        img = image.resize((224, 224))
-        img_array = np.array(img)[None, ...]
-        img_array = img_array / 255.0
-        
-        disease_pct = disease_pct_model.predict(img_array, verbose=0)[0][0]
+        if DISEASE_PCT_BACKEND == 'tflite':
+            disease_pct = tflite_disease_infer(img_array[None, ...])
+        else:
+            disease_pct_infer, _ = get_tf_disease_fns()
+            disease_pct = disease_pct_infer(img_array[None, ...]).numpy()[0, 0]
         print(f"✅ Disease detection: {disease_pct*100:.1f}%")
         return float(disease_pct)
     except Exception as e:
         print(f"Disease % prediction error: {e}")
-        return simple_disease_detection(image)
+        return simple_disease_detection(image, pixels=img_array)
+
+def predict_disease_percentage_batch(images):
+    """Predict disease percentage for a list of PIL images with one model call"""
+    if not images:
+        return np.empty(0, dtype=np.float32)
+    
+    if DISEASE_PCT_BACKEND != 'tensorflow':
+        # Only the TF graph takes a batch dimension; other backends go per image
+        return np.array([predict_disease_percentage(img) for img in images], dtype=np.float32)
+    
+    try:
+        # PIL releases the GIL while resizing, so resize on the worker pool
+        img_arrays = list(EXECUTOR.map(model_input_array, images))
+    except Exception as e:
+        print(f"Disease % batch prediction error: {e}")
+        return np.array([simple_disease_detection(img) for img in images], dtype=np.float32)
+    
+    try:
+        _, disease_pct_infer_batch = get_tf_disease_fns()
+        disease_pcts = disease_pct_infer_batch(np.stack(img_arrays)).numpy().ravel()
+        print(f"✅ Disease detection for {len(disease_pcts)} images")
+        return disease_pcts
+    except Exception as e:
+        print(f"Disease % batch prediction error: {e}")
+        return np.array([simple_disease_detection(img, pixels=arr) for img, arr in zip(images, img_arrays)],
+                        dtype=np.float32)
 
-def simple_disease_detection(image):
-    """Simple color-based disease detection for demo"""
+def simple_disease_detection(image, pixels=None):
+    """Simple color-based disease detection for demo (pixels: optional pre-resized RGB array)"""
     try:
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        if pixels is None:
+            # Convert to RGB if needed
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            
+            # Resize for faster processing
+            image = image.resize((100, 100))
+            pixels = np.array(image)
         
-        # Resize for faster processing
-        image = image.resize((100, 100))
-        pixels = np.array(image)
+        r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
         
         # Detect brown/yellow spots (disease indicators)
-        # Brown: high R, low G, low B
-        brown_mask = (pixels[:,:,0] > 100) & (pixels[:,:,1] < 100) & (pixels[:,:,2] < 80)
-        
-        # Yellow spots: high R, high G, low B
-        yellow_mask = (pixels[:,:,0] > 150) & (pixels[:,:,1] > 100) & (pixels[:,:,2] < 100)
+        # Brown: high R, low G, low B / Yellow: high R, high G, low B
+        disease_mask = ((r > 100) & (g < 100) & (b < 80)) | ((r > 150) & (g > 100) & (b < 100))
         
-        disease_pixels = np.sum(brown_mask | yellow_mask)
+        disease_pixels = np.count_nonzero(disease_mask)
         total_pixels = pixels.shape[0] * pixels.shape[1]
         
         disease_ratio = disease_pixels / total_pixels
         
         # Add randomness for variety
-        disease_pct = min(0.5, disease_ratio * 3 + np.random.uniform(0, 0.15))
+        disease_pct = min(0.5, disease_ratio * 3 + RNG.uniform(0, 0.15))
         
         print(f"✅ Simple disease detection: {disease_pct*100:.1f}%")
         return round(disease_pct, 4)
         
     except Exception as e:
         print(f"Simple disease detection error: {e}")
-        return np.random.uniform(0.05, 0.25)
+        return RNG.uniform(0.05, 0.25)
+
+def dcri_features(crop_name, disease_percent, weather_data, soil_data):
+    """Build the RandomForest feature row for one crop"""
+    # Features: crop_type, disease_percent, soil_moisture, temperature,
+    #           humidity, rainfall, soil_ph, region_risk_factor
+    return [
+        CROP_MAP.get(crop_name, 0),
+        disease_percent * 100,  # Convert to percentage (0-100)
+        soil_data.get('moisture', 50),
+        weather_data['temperature'],
+        weather_data['humidity'],
+        weather_data['rainfall'],
+        soil_data['ph'],
+        0.5  # Default region risk factor
+    ]
 
 def calculate_dcri(crop_name, disease_percent, weather_data, soil_data):
     """Calculate Dynamic Crop Risk Index (alpha score)"""
     
-    # Get crop type encoding
-    crop_type = CROP_MAP.get(crop_name, 0)
-    
     if not DCRI_MODEL_AVAILABLE:
         # Dummy DCRI calculation
         return simple_dcri_calculation(disease_percent, weather_data, soil_data)
     
     try:
         # Prepare features for RandomForest model
-        # Features: crop_type, disease_percent, soil_moisture, temperature,
-        #           humidity, rainfall, soil_ph, region_risk_factor
-        features = np.array([[
-            crop_type,
-            disease_percent * 100,  # Convert to percentage (0-100)
-            soil_data.get('moisture', 50),
-            weather_data['temperature'],
-            weather_data['humidity'],
-            weather_data['rainfall'],
-            soil_data['ph'],
-            0.5  # Default region risk factor
-        ]])
+        features = np.array([dcri_features(crop_name, disease_percent, weather_data, soil_data)])
         
         # Scale and predict
         features_scaled = dcri_scaler.transform(features)
@@ -297,38 +652,148 @@ def calculate_dcri(crop_name, disease_percent, weather_data, soil_data):
         print(f"DCRI calculation error: {e}")
         return simple_dcri_calculation(disease_percent, weather_data, soil_data)
 
-def simple_dcri_calculation(disease_percent, weather_data, soil_data):
-    """Simple DCRI calculation for demo"""
+def calculate_dcri_batch(crop_names, disease_pcts, weather_list, soil_list):
+    """Calculate DCRI for many crops with a single scaler/model call"""
+    if not crop_names:
+        return []
+    
+    if not DCRI_MODEL_AVAILABLE:
+        return simple_dcri_calculation_batch(disease_pcts, weather_list, soil_list)
+    
+    try:
+        features = np.array([
+            dcri_features(name, pct, weather, soil)
+            for name, pct, weather, soil in zip(crop_names, disease_pcts, weather_list, soil_list)
+        ])
+        
+        alphas = dcri_model.predict(dcri_scaler.transform(features))
+        alpha_scores = (alphas * 1000).astype(int).tolist()
+        
+        print(f"✅ DCRI calculated for {len(alpha_scores)} crops")
+        return alpha_scores
+        
+    except Exception as e:
+        print(f"DCRI batch calculation error: {e}")
+        return simple_dcri_calculation_batch(disease_pcts, weather_list, soil_list)
+
+@njit(cache=True)
+def simple_dcri_kernel(disease_percent, temp, humidity, rainfall, ph, moisture):
+    """Simple DCRI arithmetic on scalars -> (disease, climate, soil, total)"""
     # Disease component (0-400)
     disease_score = disease_percent * 400
     
     # Climate component (0-300)
-    temp = weather_data['temperature']
-    humidity = weather_data['humidity']
-    rainfall = weather_data['rainfall']
-    
     temp_stress = abs(temp - 25) * 5
     humidity_stress = abs(humidity - 60) * 2
-    rainfall_stress = max(0, rainfall - 30) * 3
+    rainfall_stress = max(0.0, rainfall - 30) * 3
     
-    climate_score = min(300, temp_stress + humidity_stress + rainfall_stress)
+    climate_score = min(300.0, temp_stress + humidity_stress + rainfall_stress)
     
     # Soil component (0-300)
-    ph = soil_data.get('ph', 6.5)
-    moisture = soil_data.get('moisture', 50)
-    
     ph_stress = abs(ph - 6.5) * 50
     moisture_stress = abs(moisture - 50) * 3
     
-    soil_score = min(300, ph_stress + moisture_stress)
+    soil_score = min(300.0, ph_stress + moisture_stress)
     
     # Total alpha score (0-1000)
     alpha_score = int(disease_score + climate_score + soil_score)
     alpha_score = max(0, min(1000, alpha_score))
     
+    return disease_score, climate_score, soil_score, alpha_score
+
+@njit(cache=True, parallel=True)
+def simple_dcri_batch_kernel(disease, temp, humidity, rainfall, ph, moisture):
+    """simple_dcri_kernel over arrays of length N"""
+    n = disease.shape[0]
+    alpha_scores = np.empty(n, dtype=np.int64)
+    for i in prange(n):
+        alpha_scores[i] = simple_dcri_kernel(
+            disease[i], temp[i], humidity[i], rainfall[i], ph[i], moisture[i]
+        )[3]
+    return alpha_scores
+
+def simple_dcri_calculation(disease_percent, weather_data, soil_data):
+    """Simple DCRI calculation for demo"""
+    disease_score, climate_score, soil_score, alpha_score = simple_dcri_kernel(
+        float(disease_percent),
+        float(weather_data['temperature']),
+        float(weather_data['humidity']),
+        float(weather_data['rainfall']),
+        float(soil_data.get('ph', 6.5)),
+        float(soil_data.get('moisture', 50))
+    )
+    
     print(f"✅ Simple DCRI: Disease={disease_score:.0f}, Climate={climate_score:.0f}, Soil={soil_score:.0f}, Total={alpha_score}")
     return alpha_score
 
+def simple_dcri_calculation_batch(disease_pcts, weather_list, soil_list):
+    """Batched simple_dcri_calculation over many crops"""
+    alpha_scores = simple_dcri_batch_kernel(
+        np.asarray(disease_pcts, dtype=np.float64),
+        np.array([w['temperature'] for w in weather_list], dtype=np.float64),
+        np.array([w['humidity'] for w in weather_list], dtype=np.float64),
+        np.array([w['rainfall'] for w in weather_list], dtype=np.float64),
+        np.array([s.get('ph', 6.5) for s in soil_list], dtype=np.float64),
+        np.array([s.get('moisture', 50) for s in soil_list], dtype=np.float64)
+    )
+    
+    print(f"✅ Simple DCRI calculated for {len(alpha_scores)} crops")
+    return alpha_scores.tolist()
+
+def run_daily_dcri_update():
+    """Recalculate DCRI for all tracked crops and return the updates"""
+    print(f"\n{'='*60}")
+    print(f"Daily DCRI Update - {datetime.now()}")
+    print(f"{'='*60}")
+    
+    updates = []
+    
+    crop_dcri_data = load_crops()
+    print(f"\nUpdating {len(crop_dcri_data)} crops...")
+    
+    # Fetch weather and soil for every crop in one concurrent batch
+    env_data = fetch_env_data([(d['latitude'], d['longitude']) for d in crop_dcri_data.values()])
+    
+    crop_ids = list(crop_dcri_data)
+    crop_names = [data.get('crop_name', 'Tomato') for data in crop_dcri_data.values()]
+    
+    # Simulate disease progression, drawing all the noise in one call
+    old_disease_pcts = np.array([data.get('last_disease_pct', 0.3) for data in crop_dcri_data.values()],
+                                dtype=np.float64)
+    disease_pcts = np.clip(old_disease_pcts + RNG.uniform(-0.05, 0.05, size=len(crop_ids)), 0, 1)
+    
+    # Calculate new DCRI for all crops in one model call
+    alpha_scores = calculate_dcri_batch(
+        crop_names,
+        disease_pcts,
+        [weather for weather, _ in env_data],
+        [soil for _, soil in env_data]
+    )
+    
+    for crop_id, alpha_score in zip(crop_ids, alpha_scores):
+        updates.append({
+            'cropId': crop_id,
+            'alphaScore': alpha_score,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    # Save updated data in a single transaction
+    now = datetime.now().isoformat()
+    update_crop_disease([(crop_id, pct, now) for crop_id, pct in zip(crop_ids, disease_pcts)])
+    
+    print(f"\n✅ Updated {len(updates)} crops")
+    print(f"{'='*60}\n")
+    
+    return updates
+
+def json_response(payload, status=200):
+    """jsonify() replacement that encodes with orjson (numpy scalars allowed)"""
+    return app.response_class(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype='application/json'
+    )
+
 # =============== Routes ===============
 
 @app.route("/")
@@ -345,10 +810,16 @@ def dashboard(role):
 def process_crop_listing():
     """Process new crop listing with DCRI calculation"""
     try:
-        data = request.get_json()
-        crop_id = data.get('cropId', 0)
+        if 'image' in request.files:
+            # Multipart upload: raw image bytes, no base64 round trip
+            data = request.form
+            crop_id = data.get('cropId', 0, type=int)
+            image_data = request.files['image'].read()
+        else:
+            data = orjson.loads(request.get_data())
+            crop_id = data.get('cropId', 0)
+            image_data = decode_base64_image(data['image'])
         crop_name = data.get('cropName', 'Tomato')
-        image_base64 = data['image']
         lat = float(data['latitude'])
         lon = float(data['longitude'])
         
@@ -356,28 +827,35 @@ def process_crop_listing():
         print(f"Processing crop: {crop_name} at ({lat}, {lon})")
         print(f"{'='*60}")
         
-        # Decode image
-        image_data = base64.b64decode(image_base64.split(',')[1])
-        img = Image.open(BytesIO(image_data)).convert("RGB")
+        # Decode image; for JPEGs, draft() lets libjpeg decode at a reduced
+        # scale that is still >= the 224x224 the model needs
+        img = Image.open(BytesIO(image_data))
+        content_type = Image.MIME.get(img.format, 'image/jpeg')
+        img.draft('RGB', (224, 224))
+        img = img.convert("RGB")
         
-        # Step 1: Upload to IPFS
+        # Steps 1-4 are independent, so run them in parallel; the request
+        # then takes as long as the slowest one instead of their sum
+        # Step 1: Upload the original bytes to IPFS (no re-encode)
         print("\n1️⃣ Uploading to IPFS...")
-        img_bytes = BytesIO()
-        img.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        ipfs_hash = upload_to_ipfs(img_bytes)
+        ipfs_future = EXECUTOR.submit(upload_to_ipfs, BytesIO(image_data), content_type)
         
         # Step 2: Predict disease percentage
         print("\n2️⃣ Analyzing crop for disease...")
-        disease_pct = predict_disease_percentage(img)
+        disease_future = EXECUTOR.submit(predict_disease_percentage, img)
         
         # Step 3: Get weather data
         print("\n3️⃣ Fetching weather data...")
-        weather_data = get_weather_data(lat, lon)
+        weather_future = EXECUTOR.submit(get_weather_data, lat, lon)
         
         # Step 4: Get soil data
         print("\n4️⃣ Fetching soil data...")
-        soil_data = get_soil_data(lat, lon)
+        soil_future = EXECUTOR.submit(get_soil_data, lat, lon)
+        
+        ipfs_hash = ipfs_future.result()
+        disease_pct = disease_future.result()
+        weather_data = weather_future.result()
+        soil_data = soil_future.result()
         
         # Step 5: Calculate DCRI
         print("\n5️⃣ Calculating DCRI (alpha score)...")
@@ -385,17 +863,7 @@ def process_crop_listing():
         
         # Store for daily updates
         if crop_id:
-            crop_dcri_data[str(crop_id)] = {
-                'crop_name': crop_name,
-                'latitude': lat,
-                'longitude': lon,
-                'last_disease_pct': disease_pct,
-                'last_update': datetime.now().isoformat()
-            }
-            
-            # Save to file
-            with open('crop_dcri_data.json', 'w') as f:
-                json.dump(crop_dcri_data, f)
+            save_crop(crop_id, crop_name, lat, lon, disease_pct, datetime.now().isoformat())
         
         print(f"\n{'='*60}")
         print(f"✅ Processing complete!")
@@ -404,7 +872,7 @@ def process_crop_listing():
         print(f"   Alpha: {alpha_score}/1000")
         print(f"{'='*60}\n")
         
-        return jsonify({
+        return json_response({
             'success': True,
             'ipfsHash': ipfs_hash,
             'diseasePercentage': disease_pct,
@@ -417,57 +885,17 @@ def process_crop_listing():
         print(f"\n❌ Error in process_crop_listing: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 @app.route("/api/update_dcri_daily", methods=["POST"])
 def update_dcri_daily():
-    """Update DCRI for all active crops (called by scheduler)"""
+    """Update DCRI for all active crops"""
     try:
-        print(f"\n{'='*60}")
-        print(f"Daily DCRI Update - {datetime.now()}")
-        print(f"{'='*60}")
-        
-        updates = []
-        
-        for crop_id, data in crop_dcri_data.items():
-            crop_name = data.get('crop_name', 'Tomato')
-            lat = data['latitude']
-            lon = data['longitude']
-            
-            print(f"\nUpdating Crop ID {crop_id} ({crop_name})...")
-            
-            # Get fresh data
-            weather_data = get_weather_data(lat, lon)
-            soil_data = get_soil_data(lat, lon)
-            
-            # Simulate disease progression
-            old_disease_pct = data.get('last_disease_pct', 0.3)
-            disease_pct = np.clip(old_disease_pct + np.random.uniform(-0.05, 0.05), 0, 1)
-            
-            # Calculate new DCRI
-            alpha_score = calculate_dcri(crop_name, disease_pct, weather_data, soil_data)
-            
-            updates.append({
-                'cropId': crop_id,
-                'alphaScore': alpha_score,
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            crop_dcri_data[crop_id]['last_disease_pct'] = disease_pct
-            crop_dcri_data[crop_id]['last_update'] = datetime.now().isoformat()
-        
-        # Save updated data
-        with open('crop_dcri_data.json', 'w') as f:
-            json.dump(crop_dcri_data, f)
-        
-        print(f"\n✅ Updated {len(updates)} crops")
-        print(f"{'='*60}\n")
-        
-        return jsonify({'success': True, 'updates': updates})
+        return json_response({'success': True, 'updates': run_daily_dcri_update()})
         
     except Exception as e:
         print(f"\n❌ Daily update error: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 # =============== Scheduler ===============
 
@@ -475,24 +903,37 @@ def scheduled_dcri_update():
     """Daily DCRI update job"""
     try:
         print(f"\n🕐 Running scheduled DCRI update at {datetime.now()}")
-        with app.test_request_context():
-            update_dcri_daily()
+        run_daily_dcri_update()
     except Exception as e:
         print(f"Scheduled update error: {e}")
 
 # Initialize scheduler
+# Only starts when RUN_SCHEDULER is set (or when running app.py directly).
+# Workers inherit the environment, so under gunicorn this relies on --preload:
+# the module is imported once in the master and the scheduler thread does not
+# survive the fork. Without --preload every worker imports the module and the
+# daily job would run once per worker; set RUN_SCHEDULER on one process only.
 scheduler = BackgroundScheduler()
 scheduler.add_job(func=scheduled_dcri_update, trigger="cron", hour=0, minute=0)
-scheduler.start()
+if os.environ.get("RUN_SCHEDULER"):
+    scheduler.start()
 
-# Load existing crop data
-try:
-    with open('crop_dcri_data.json', 'r') as f:
-        crop_dcri_data = json.load(f)
-    print(f"✅ Loaded {len(crop_dcri_data)} existing crops")
-except FileNotFoundError:
-    crop_dcri_data = {}
+# Load existing crop data, importing the old JSON store on first run
+init_db()
+existing_crops = load_crops()
+if not existing_crops and os.path.exists('crop_dcri_data.json'):
+    with open('crop_dcri_data.json', 'rb') as f:
+        for crop_id, data in orjson.loads(f.read()).items():
+            save_crop(crop_id, data.get('crop_name', 'Tomato'), data['latitude'], data['longitude'],
+                      data.get('last_disease_pct', 0.3), data.get('last_update'))
+    existing_crops = load_crops()
+    print("✅ Imported crop_dcri_data.json into crops.db")
+
+if existing_crops:
+    print(f"✅ Loaded {len(existing_crops)} existing crops")
+else:
     print("⚠️ No existing crop data found")
+close_db()  # don't carry an open connection into forked workers
 
 # =============== Run App ===============
 
@@ -506,4 +947,8 @@ if __name__ == "__main__":
     print(f"Soil API: ISRIC SoilGrids v2.0")
     print("=" * 60 + "\n")
     
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    if not scheduler.running:
+        scheduler.start()
+    
+    # Development only; in production serve with gunicorn (see README)
+    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
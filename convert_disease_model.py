@@ -0,0 +1,41 @@
+"""
+Convert disease_percentage_model.h5 to an int8-quantized TFLite model
+Usage: python convert_disease_model.py <sample_images_dir> [num_samples]
+"""
+
+import os
+import sys
+import numpy as np
+from PIL import Image
+import tensorflow as tf
+from tensorflow import keras
+
+def representative_dataset(image_dir, num_samples):
+    """Yield normalized 224x224 crop images used to calibrate the int8 ranges"""
+    names = sorted(os.listdir(image_dir))[:num_samples]
+    for name in names:
+        try:
+            img = Image.open(os.path.join(image_dir, name)).convert("RGB").resize((224, 224))
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        yield [np.asarray(img, dtype=np.float32)[None, ...] / 255.0]
+
+def convert(image_dir, num_samples=200):
+    model = keras.models.load_model('disease_percentage_model.h5')
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = lambda: representative_dataset(image_dir, num_samples)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    
+    with open('disease_percentage_model.tflite', 'wb') as f:
+        f.write(converter.convert())
+    print("✅ Saved disease_percentage_model.tflite")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    convert(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 200)